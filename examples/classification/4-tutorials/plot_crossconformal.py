@@ -31,6 +31,8 @@ from typing import Any, Dict, List, Optional, Union
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from matplotlib.colors import ListedColormap
+from sklearn.base import ClassifierMixin
 from sklearn.model_selection import KFold
 from sklearn.naive_bayes import GaussianNB
 from typing_extensions import TypedDict
@@ -38,7 +40,7 @@ from typing_extensions import TypedDict
 from mapie._typing import NDArray
 from mapie.classification import MapieClassifier
 from mapie.metrics import (classification_coverage_score,
-                           classification_mean_width_score)
+                           classification_coverage_score_v2)
 
 ##############################################################################
 # 1. Estimating the impact of train/calibration split on the prediction sets
@@ -53,25 +55,26 @@ from mapie.metrics import (classification_coverage_score,
 
 centers = [(0, 3.5), (-2, 0), (2, 0)]
 covs = [[[1, 0], [0, 1]], [[2, 0], [0, 2]], [[5, 0], [0, 1]]]
-x_min, x_max, y_min, y_max, step = -5, 7, -5, 7, 0.1
+x_min, x_max, y_min, y_max, step = -5, 7, -5, 7, 0.15
 n_samples = 500
 n_classes = 3
 n_cv = 5
 np.random.seed(42)
+rng = np.random.default_rng(42)
 
-X_train = np.vstack([
-    np.random.multivariate_normal(center, cov, n_samples)
-    for center, cov in zip(centers, covs)
-])
-y_train = np.hstack([np.full(n_samples, i) for i in range(n_classes)])
-
-X_test_distrib = np.vstack([
-    np.random.multivariate_normal(center, cov, 10*n_samples)
-    for center, cov in zip(centers, covs)
-])
-y_test_distrib = np.hstack(
-    [np.full(10*n_samples, i) for i in range(n_classes)]
-)
+X_train = np.empty((n_classes * n_samples, 2))
+for i, (center, cov) in enumerate(zip(centers, covs)):
+    X_train[i * n_samples:(i + 1) * n_samples] = rng.multivariate_normal(
+        center, cov, n_samples
+    )
+y_train = np.repeat(np.arange(n_classes), n_samples)
+
+X_test_distrib = np.empty((n_classes * 10 * n_samples, 2))
+for i, (center, cov) in enumerate(zip(centers, covs)):
+    X_test_distrib[i * 10 * n_samples:(i + 1) * 10 * n_samples] = (
+        rng.multivariate_normal(center, cov, 10 * n_samples)
+    )
+y_test_distrib = np.repeat(np.arange(n_classes), 10 * n_samples)
 
 xx, yy = np.meshgrid(
     np.arange(x_min, x_max, step), np.arange(x_min, x_max, step)
@@ -84,7 +87,7 @@ X_test = np.stack([xx.ravel(), yy.ravel()], axis=1)
 
 
 colors = {0: "#1f77b4", 1: "#ff7f0e", 2: "#2ca02c", 3: "#d62728"}
-y_train_col = list(map(colors.get, y_train))
+y_train_col = np.array(list(colors.values()))[y_train]
 fig = plt.figure(figsize=(7, 6))
 plt.scatter(
     X_train[:, 0],
@@ -93,6 +96,7 @@ plt.scatter(
     marker="o",
     s=10,
     edgecolor="k",
+    rasterized=True,
 )
 plt.xlabel("X")
 plt.ylabel("Y")
@@ -103,41 +107,60 @@ plt.show()
 # We split our training dataset into 5 folds and use each fold as a
 # calibration set. Each calibration set is therefore used to estimate the
 # conformity scores and the given quantiles for the two methods implemented in
-# :class:`~mapie.classification.MapieClassifier`.
-
-
-kf = KFold(n_splits=5, shuffle=True)
-clfs, mapies, y_preds, y_ps_mapies = {}, {}, {}, {}
+# :class:`~mapie.classification.MapieClassifier`. The base model trained on
+# the remaining folds does not depend on the method, so it is fitted once per
+# fold and shared by both methods.
+# The prediction sets on the test set are stored in a single array of shape
+# ``(n_methods, n_folds, n_samples, n_classes, n_alpha)``.
+
+
+kf = KFold(n_splits=5, shuffle=True, random_state=42)
+splits = list(kf.split(X_train))
+clfs = {
+    fold: GaussianNB().fit(X_train[train_index], y_train[train_index])
+    for fold, (train_index, _) in enumerate(splits)
+}
+mapies = {}
 methods = ["lac", "aps"]
-alpha = np.arange(0.01, 1, 0.01)
-for method in methods:
-    clfs_, mapies_, y_preds_, y_ps_mapies_ = {}, {}, {}, {}
-    for fold, (train_index, calib_index) in enumerate(kf.split(X_train)):
-        clf = GaussianNB().fit(X_train[train_index], y_train[train_index])
-        clfs_[fold] = clf
-        mapie = MapieClassifier(estimator=clf, cv="prefit", method=method)
+alpha = np.linspace(0.01, 0.99, 99)
+IDX_ALPHA = 9  # index of alpha = 0.1
+y_ps_mapies = np.empty(
+    (len(methods), len(splits), len(X_test_distrib), n_classes, len(alpha)),
+    dtype=bool
+)
+for im, method in enumerate(methods):
+    mapies_ = {}
+    for fold, (_, calib_index) in enumerate(splits):
+        mapie = MapieClassifier(
+            estimator=clfs[fold], cv="prefit", method=method
+        )
         mapie.fit(X_train[calib_index], y_train[calib_index])
         mapies_[fold] = mapie
-        y_pred_mapie, y_ps_mapie = mapie.predict(
+        _, y_ps_mapies[im, fold] = mapie.predict(
             X_test_distrib, alpha=alpha, include_last_label="randomized"
         )
-        y_preds_[fold], y_ps_mapies_[fold] = y_pred_mapie, y_ps_mapie
-    clfs[method], mapies[method], y_preds[method], y_ps_mapies[method] = (
-        clfs_, mapies_, y_preds_, y_ps_mapies_
-    )
+    mapies[method] = mapies_
 
 
 ##############################################################################
 # Let's now plot the distribution of conformity scores for each calibration
-# set and the estimated quantile for ``alpha`` = 0.1.
+# set and the estimated quantile for ``alpha`` = 0.1. The histograms share
+# the same bins so that the calibration sets can be compared.
 
 
+bins = np.histogram_bin_edges(
+    np.concatenate(
+        [mapie.conformity_scores_ for mapie in mapies["lac"].values()]
+    ),
+    bins=10
+)
 fig, axs = plt.subplots(1, len(mapies["lac"]), figsize=(20, 4))
 for i, (key, mapie) in enumerate(mapies["lac"].items()):
     axs[i].set_xlabel("Conformity scores")
-    axs[i].hist(mapie.conformity_scores_)
-    axs[i].axvline(mapie.quantiles_[9], ls="--", color="k")
-    axs[i].set_title(f"split={key}\nquantile={mapie.quantiles_[9]:.3f}")
+    axs[i].hist(mapie.conformity_scores_, bins=bins)
+    quantile = mapie.quantiles_[IDX_ALPHA]
+    axs[i].axvline(quantile, ls="--", color="k")
+    axs[i].set_title(f"split={key}\nquantile={quantile:.3f}")
 plt.suptitle(
     "Distribution of scores on each calibration fold for the "
     f"{methods[0]} method"
@@ -151,18 +174,24 @@ plt.show()
 # train/calibration splitting can slightly impact our results.
 #
 # Let's now visualize this impact on the number of labels included in each
-# prediction set induced by the different calibration sets.
+# prediction set induced by the different calibration sets. The coverages
+# are computed from the prediction sets already estimated on the test set,
+# where the last label is included randomly (``include_last_label``
+# set to ``"randomized"``), whereas the set sizes shown on the mesh always
+# include the last label (``include_last_label=True``).
+
+
+CMAP_PURPLES = ListedColormap(plt.cm.Purples(np.linspace(0, 1, 4)))
 
 
 def plot_results(
     mapies: Dict[int, Any],
+    y_ps: NDArray,
     X_test: NDArray,
-    X_test2: NDArray,
-    y_test2: NDArray,
+    y_true: NDArray,
     alpha: float,
     method: str
 ) -> None:
-    tab10 = plt.cm.get_cmap('Purples', 4)
     fig, axs = plt.subplots(1, len(mapies), figsize=(20, 4))
     for i, (_, mapie) in enumerate(mapies.items()):
         y_pi_sums = mapie.predict(
@@ -177,13 +206,12 @@ def plot_results(
             marker='.',
             s=10,
             alpha=1,
-            cmap=tab10,
+            cmap=CMAP_PURPLES,
             vmin=0,
-            vmax=3
-        )
-        coverage = classification_coverage_score(
-            y_test2, mapie.predict(X_test2, alpha=alpha)[1][:, :, 0]
+            vmax=3,
+            rasterized=True
         )
+        coverage = classification_coverage_score(y_true, y_ps[i])
         axs[i].set_title(f"coverage = {coverage:.3f}")
     plt.suptitle(
         "Number of labels in prediction sets "
@@ -200,26 +228,28 @@ def plot_results(
 
 plot_results(
     mapies["lac"],
+    y_ps_mapies[0, :, :, :, IDX_ALPHA],
     X_test,
-    X_test_distrib,
     y_test_distrib,
-    alpha[9],
+    alpha[IDX_ALPHA],
     "lac"
 )
 
 plot_results(
     mapies["aps"],
+    y_ps_mapies[1, :, :, :, IDX_ALPHA],
     X_test,
-    X_test_distrib,
     y_test_distrib,
-    alpha[9],
+    alpha[IDX_ALPHA],
     "aps"
 )
 
 
 ##############################################################################
 # Let's now compare the coverages and prediction set sizes obtained with the
-# different folds used as calibration sets.
+# different folds used as calibration sets. Both quantities are computed for
+# all ``alpha`` values at once from the prediction sets of shape
+# ``(n_samples, n_classes, n_alpha)``.
 
 
 def plot_coverage_width(
@@ -252,29 +282,20 @@ def plot_coverage_width(
     plt.show()
 
 
-split_coverages = np.array(
-    [
-        [
-            [
-                classification_coverage_score(
-                    y_test_distrib, y_ps[:, :, ia]
-                ) for ia, _ in enumerate(alpha)]
-            for _, y_ps in y_ps2.items()
-        ] for _, y_ps2 in y_ps_mapies.items()
-    ]
-)
+def width_sweep(y_ps: NDArray) -> NDArray:
+    return y_ps.sum(axis=(-3, -2)) / y_ps.shape[-3]
 
-split_widths = np.array(
+
+split_coverages = np.array(
     [
         [
-            [
-                classification_mean_width_score(y_ps[:, :, ia])
-                for ia, _ in enumerate(alpha)
-            ]
-            for _, y_ps in y_ps2.items()
-        ] for _, y_ps2 in y_ps_mapies.items()
+            classification_coverage_score_v2(y_test_distrib, y_ps)
+            for y_ps in y_ps_method
+        ]
+        for y_ps_method in y_ps_mapies
     ]
 )
+split_widths = width_sweep(y_ps_mapies)
 
 plot_coverage_width(
     alpha, split_coverages[0], split_widths[0], "lac"
@@ -314,13 +335,20 @@ plot_coverage_width(
 # :class:`~mapie.classification.MapieClassifier`.
 #
 # All we need to do is to provide with the `cv` argument a cross-validation
-# object or an integer giving the number of folds.
+# object or an integer giving the number of folds. We reuse the seeded
+# ``KFold`` object of the first part and the same ``GaussianNB`` base model,
+# so that the cross-conformal and split-conformal approaches rely on the same
+# folds and the same base model.
 # When estimating the prediction sets, we define how the scores are aggregated
-# with the ``agg_scores`` attribute.
+# with the ``agg_scores`` attribute. The aggregation only matters at
+# prediction time, so a single fitted
+# :class:`~mapie.classification.MapieClassifier` per method is shared by
+# both aggregation strategies.
 
 Params = TypedDict(
     "Params",
     {
+        "estimator": ClassifierMixin,
         "method": str,
         "cv": Optional[Union[int, str]],
         "random_state": Optional[int]
@@ -334,37 +362,41 @@ ParamsPredict = TypedDict(
     }
 )
 
-kf = KFold(n_splits=5, shuffle=True)
-
 STRATEGIES = {
-    "score_cv_mean": (
-        Params(method="lac", cv=kf, random_state=42),
-        ParamsPredict(include_last_label=False, agg_scores="mean")
-    ),
-    "score_cv_crossval": (
-        Params(method="lac", cv=kf, random_state=42),
-        ParamsPredict(include_last_label=False, agg_scores="crossval")
-    ),
-    "cum_score_cv_mean": (
-        Params(method="aps", cv=kf, random_state=42),
-        ParamsPredict(include_last_label="randomized", agg_scores="mean")
+    "lac": (
+        Params(estimator=GaussianNB(), method="lac", cv=kf, random_state=42),
+        {
+            "score_cv_mean": ParamsPredict(
+                include_last_label=False, agg_scores="mean"
+            ),
+            "score_cv_crossval": ParamsPredict(
+                include_last_label=False, agg_scores="crossval"
+            )
+        }
     ),
-    "cum_score_cv_crossval": (
-        Params(method="aps", cv=kf, random_state=42),
-        ParamsPredict(include_last_label='randomized', agg_scores="crossval")
+    "aps": (
+        Params(estimator=GaussianNB(), method="aps", cv=kf, random_state=42),
+        {
+            "cum_score_cv_mean": ParamsPredict(
+                include_last_label="randomized", agg_scores="mean"
+            ),
+            "cum_score_cv_crossval": ParamsPredict(
+                include_last_label="randomized", agg_scores="crossval"
+            )
+        }
     )
 }
 
 y_ps = {}
-for strategy, params in STRATEGIES.items():
-    args_init, args_predict = STRATEGIES[strategy]
+for method, (args_init, strategies_predict) in STRATEGIES.items():
     mapie_clf = MapieClassifier(**args_init)
     mapie_clf.fit(X_train, y_train)
-    _, y_ps[strategy] = mapie_clf.predict(
-        X_test_distrib,
-        alpha=alpha,
-        **args_predict
-    )
+    for strategy, args_predict in strategies_predict.items():
+        _, y_ps[strategy] = mapie_clf.predict(
+            X_test_distrib,
+            alpha=alpha,
+            **args_predict
+        )
 
 
 ##############################################################################
@@ -377,20 +409,10 @@ for strategy, params in STRATEGIES.items():
 coverages, widths, violations = {}, {}, {}
 
 for strategy, y_ps_ in y_ps.items():
-    coverages[strategy] = np.array(
-        [
-            classification_coverage_score(
-                y_test_distrib,
-                y_ps_[:, :, ia]
-            ) for ia, _ in enumerate(alpha)
-        ]
-    )
-    widths[strategy] = np.array(
-        [
-            classification_mean_width_score(y_ps_[:, :, ia])
-            for ia, _ in enumerate(alpha)
-        ]
+    coverages[strategy] = classification_coverage_score_v2(
+        y_test_distrib, y_ps_
     )
+    widths[strategy] = width_sweep(y_ps_)
     violations[strategy] = np.abs(coverages[strategy] - (1 - alpha)).mean()
 
 
@@ -12,6 +12,7 @@ from sklearn.model_selection import (BaseCrossValidator, KFold, LeaveOneOut,
                                      ShuffleSplit)
 from sklearn.utils.validation import check_is_fitted
 
+from mapie._compatibility import np_quantile
 from mapie._typing import ArrayLike, NDArray
 from mapie.regression import MapieQuantileRegressor
 from mapie.utils import (check_alpha, check_alpha_and_n_samples,
@@ -303,6 +304,24 @@ def test_compute_quantiles_2D_shape(alphas: NDArray):
     assert len(quantiles) == len(alphas)
 
 
+@pytest.mark.parametrize("alphas", ALPHAS)
+def test_compute_quantiles_2D_values(alphas: NDArray):
+    """Test that the quantiles of a 2D input vector are the "higher"
+    quantiles of levels (n + 1) * (1 - alpha) / n computed for each alpha.
+    """
+    vector = RandomState(random_state).rand(999, 1)
+    n = len(vector)
+    expected = np.stack(
+        [
+            np_quantile(vector, ((n + 1) * (1 - _alpha)) / n, method="higher")
+            for _alpha in alphas
+        ]
+    )
+    quantiles = compute_quantiles(vector, alphas)
+
+    np.testing.assert_allclose(quantiles, expected)
+
+
 @pytest.mark.parametrize("alphas", ALPHAS)
 def test_compute_quantiles_3D_shape(alphas: NDArray):
     """Test that the number of quantiles is equal to
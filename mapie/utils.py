@@ -755,15 +755,10 @@ def compute_quantiles(vector: NDArray, alpha: NDArray) -> NDArray:
     """
     n = len(vector)
     if len(vector.shape) <= 2:
-        quantiles_ = np.stack(
-            [
-                np_quantile(
-                    vector,
-                    ((n + 1) * (1 - _alpha)) / n,
-                    method="higher",
-                )
-                for _alpha in alpha
-            ]
+        quantiles_ = np_quantile(
+            vector,
+            ((n + 1) * (1 - np.asarray(alpha))) / n,
+            method="higher",
         )
 
     else: